@@ -1,10 +1,19 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel, Field
 from typing import Literal, List, Optional, Tuple
 
 # Usa tus utilidades del código original (L'Hôpital + parser seguro)
 # Ajustá el import si tu estructura de carpetas difiere.
 from utils.expressions import make_safe_function, check_for_singularities
+from utils.safe_eval import ExpressionLimitError, check_constant_limits
+from utils.cache import response_cache, request_key, normalize_expression
+from utils.admission import (
+    admission,
+    client_id_from,
+    estimate_integracion_cost,
+    estimate_convergencia_cost,
+    DeadlineExceeded,
+)
 
 # Servicios con los métodos y helpers de muestreo
 from services.integracion_service import (
@@ -13,7 +22,9 @@ from services.integracion_service import (
     run_simpson_13,
     run_simpson_38,
     run_boole,
+    run_weddle,
     run_adaptativo,
+    run_convergencia,
     sample_curve,
 )
 
@@ -27,9 +38,19 @@ MetodoIntegracion = Literal[
     "simpson_13",
     "simpson_38",
     "boole",
+    "weddle",
     "adaptativo",
 ]
 
+# Reglas cerradas cuyas grillas se anidan al duplicar n
+MetodoCompuesto = Literal[
+    "trapezoidal",
+    "simpson_13",
+    "simpson_38",
+    "boole",
+    "weddle",
+]
+
 class PuntoTabla(BaseModel):
     index: int
     x: float
@@ -54,46 +75,133 @@ class IntegracionResponse(BaseModel):
     points: List[PuntoTabla]
     curva_f: List[Tuple[float, Optional[float]]]  # (x, f(x))
 
+class ConvergenciaRequest(BaseModel):
+    metodo: MetodoCompuesto
+    fx: str = Field(..., description="Función f(x) a integrar. Ej: 'sin(x)/x'")
+    a: float
+    b: float
+    n0: int = Field(2, ge=1, description="Subdivisiones del primer nivel (se ajusta al múltiplo de la regla)")
+    niveles: int = Field(6, ge=2, le=30, description="Cantidad de niveles: n0, 2·n0, ..., 2^(niveles-1)·n0")
+
+class NivelConvergencia(BaseModel):
+    n: int
+    step_size: float
+    value: float
+    new_evaluations: int
+    function_evaluations: int
+    error_estimate: Optional[float] = None
+    observed_order: Optional[float] = None
+
+class ConvergenciaResponse(BaseModel):
+    metodo: MetodoCompuesto
+    value: float
+    theoretical_order: int
+    function_evaluations: int
+    niveles: List[NivelConvergencia]
+
+# ---------- Helpers ----------
+
+def _construir_funcion(fx: str, a: float, b: float):
+    """Normaliza fx, detecta singularidades removibles (L'Hôpital) y arma f(x)."""
+    # Normalizamos la expresión a sintaxis Python
+    expr = (fx or "").replace("^", "**").strip()
+    if not expr:
+        raise HTTPException(status_code=400, detail="fx es requerido")
+
+    # 0) Validar la expresión (nodos y nombres permitidos) antes de que la vea SymPy:
+    #    '1<<10**10' o "'a'*10**10" arman objetos gigantes aun sin potencias
+    lhopital_points = {}
+    try:
+        f = make_safe_function(expr, lhopital_points=lhopital_points)
+    except (SyntaxError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Expresión inválida: {e}")
+
+    # 1) Rechazar operandos gigantes (p. ej. 9**9**9) antes de pasar por SymPy
+    check_constant_limits(expr)
+
+    # 2) Detectar singularidades con tu analizador (L'Hôpital)
+    #    Esto devuelve una lista de (x_critico, valor_limite)
+    _has_sing, critical_list, _msg = check_for_singularities(expr, a, b)
+
+    # 3) f(x) respeta esos puntos críticos (evalúa el límite en esos x): el dict
+    #    se completa acá porque f ya lo referencia
+    lhopital_points.update({float(xc): float(val) for (xc, val) in critical_list})
+    return f
+
+# ---------- Caché ----------
+
+def _clave_integracion(req: IntegracionRequest) -> str:
+    """Clave canónica: sólo los campos que afectan al resultado del método elegido."""
+    payload = {
+        "metodo": req.metodo,
+        "fx": normalize_expression(req.fx),
+        "a": float(req.a),
+        "b": float(req.b),
+    }
+    if req.metodo == "adaptativo":
+        payload["tol"] = float(req.tol or 1e-6)
+    else:
+        payload["n"] = int(req.n or 10)
+    return request_key("integracion", payload)
+
+def _clave_convergencia(req: ConvergenciaRequest) -> str:
+    payload = {
+        "metodo": req.metodo,
+        "fx": normalize_expression(req.fx),
+        "a": float(req.a),
+        "b": float(req.b),
+        "n0": int(req.n0),
+        "niveles": int(req.niveles),
+    }
+    return request_key("convergencia", payload)
+
 # ---------- Endpoint ----------
 
 @router.post("/integracion/resolver", response_model=IntegracionResponse)
-def resolver_integracion(req: IntegracionRequest):
+def resolver_integracion(req: IntegracionRequest, request: Request):
+    return response_cache.respond(
+        request, _clave_integracion(req),
+        lambda: _admitir_integracion(req, client_id_from(request)),
+    )
+
+@router.get("/integracion/resolver", response_model=IntegracionResponse)
+def resolver_integracion_get(request: Request, req: IntegracionRequest = Depends()):
+    """Misma operación por query string: el navegador la cachea y revalida con el ETag."""
+    return resolver_integracion(req, request)
+
+def _admitir_integracion(req: IntegracionRequest, client_id: str) -> IntegracionResponse:
+    costo = estimate_integracion_cost(req.metodo, req.fx, int(req.n or 10), float(req.tol or 1e-6))
+    with admission.admit(client_id, costo) as deadline:
+        return _calcular_integracion(req, deadline)
+
+def _calcular_integracion(req: IntegracionRequest, deadline=None) -> IntegracionResponse:
     try:
         a = float(req.a)
         b = float(req.b)
         if a == b:
             raise HTTPException(status_code=400, detail="a y b no pueden ser iguales")
 
-        # Normalizamos la expresión a sintaxis Python
-        expr = (req.fx or "").replace("^", "**").strip()
-        if not expr:
-            raise HTTPException(status_code=400, detail="fx es requerido")
-
-        # 1) Detectar singularidades con tu analizador (L'Hôpital)
-        #    Esto devuelve una lista de (x_critico, valor_limite)
-        _has_sing, critical_list, _msg = check_for_singularities(expr, a, b)
-
-        # 2) Construir f(x) respetando esos puntos críticos (evalúa el límite en esos x)
-        lhopital_points = {float(xc): float(val) for (xc, val) in critical_list}
-        f = make_safe_function(expr, lhopital_points=lhopital_points)
+        f = _construir_funcion(req.fx, a, b)
 
-        # 3) Ejecutar el método
+        # Ejecutar el método
         metodo = req.metodo
         n = int(req.n or 10)
 
         if metodo == "rectangulo":
-            res = run_rectangulo(f, a, b, n)
+            res = run_rectangulo(f, a, b, n, deadline)
         elif metodo == "trapezoidal":
-            res = run_trapezoidal(f, a, b, n)
+            res = run_trapezoidal(f, a, b, n, deadline)
         elif metodo == "simpson_13":
-            res = run_simpson_13(f, a, b, n)  # ajusta par internamente
+            res = run_simpson_13(f, a, b, n, deadline)  # ajusta par internamente
         elif metodo == "simpson_38":
-            res = run_simpson_38(f, a, b, n)  # ajusta múltiplo de 3 internamente
+            res = run_simpson_38(f, a, b, n, deadline)  # ajusta múltiplo de 3 internamente
         elif metodo == "boole":
-            res = run_boole(f, a, b, n)       # ajusta múltiplo de 4 internamente
+            res = run_boole(f, a, b, n, deadline)       # ajusta múltiplo de 4 internamente
+        elif metodo == "weddle":
+            res = run_weddle(f, a, b, n, deadline)      # ajusta múltiplo de 6 internamente
         elif metodo == "adaptativo":
             tol = float(req.tol or 1e-6)
-            res = run_adaptativo(f, a, b, tol)
+            res = run_adaptativo(f, a, b, tol, deadline)
         else:
             raise HTTPException(status_code=400, detail="Método no reconocido")
 
@@ -112,5 +220,64 @@ def resolver_integracion(req: IntegracionRequest):
 
     except HTTPException:
         raise
+    except ExpressionLimitError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/integracion/convergencia", response_model=ConvergenciaResponse)
+def estudio_convergencia(req: ConvergenciaRequest, request: Request):
+    return response_cache.respond(
+        request, _clave_convergencia(req),
+        lambda: _admitir_convergencia(req, client_id_from(request)),
+    )
+
+@router.get("/integracion/convergencia", response_model=ConvergenciaResponse)
+def estudio_convergencia_get(request: Request, req: ConvergenciaRequest = Depends()):
+    return estudio_convergencia(req, request)
+
+def _admitir_convergencia(req: ConvergenciaRequest, client_id: str) -> ConvergenciaResponse:
+    costo = estimate_convergencia_cost(req.metodo, req.fx, req.n0, req.niveles)
+    with admission.admit(client_id, costo) as deadline:
+        return _calcular_convergencia(req, deadline)
+
+def _calcular_convergencia(req: ConvergenciaRequest, deadline=None) -> ConvergenciaResponse:
+    try:
+        a = float(req.a)
+        b = float(req.b)
+        if a == b:
+            raise HTTPException(status_code=400, detail="a y b no pueden ser iguales")
+
+        f = _construir_funcion(req.fx, a, b)
+        res = run_convergencia(f, a, b, req.metodo, int(req.n0), int(req.niveles), deadline)
+
+        return ConvergenciaResponse(
+            metodo=req.metodo,
+            value=res["value"],
+            theoretical_order=res["order"],
+            function_evaluations=res["evals"],
+            niveles=[
+                NivelConvergencia(
+                    n=lv["n"],
+                    step_size=lv["h"],
+                    value=lv["value"],
+                    new_evaluations=lv["new_evals"],
+                    function_evaluations=lv["evals"],
+                    error_estimate=lv["error_estimate"],
+                    observed_order=lv["observed_order"],
+                )
+                for lv in res["levels"]
+            ],
+        )
+
+    except HTTPException:
+        raise
+    except ExpressionLimitError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
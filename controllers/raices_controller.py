@@ -1,10 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional, Literal, List, Tuple
 from services.newton_service import run_newton
 from services.punto_fijo_service import run_punto_fijo
 from services.aitken_service import run_aitken
-from utils.safe_eval import make_safe_func
+from utils.safe_eval import make_safe_func, ExpressionLimitError
+from utils.cache import response_cache, request_key, normalize_expression
+from utils.admission import admission, client_id_from, estimate_raices_cost, DeadlineExceeded
 
 router = APIRouter()
 
@@ -75,9 +77,39 @@ def _sample_curve(func, x_min: float, x_max: float, n: int = 401) -> List[Tuple[
         xs.append(x); ys.append(y)
     return list(zip(xs, ys))
 
+def _clave_metodo(req: MetodoRequest) -> str:
+    payload = {
+        "metodo": req.metodo,
+        "fx": normalize_expression(req.fx),
+        "gx": normalize_expression(req.gx),
+        # dfx sólo lo usa Newton
+        "dfx": normalize_expression(req.dfx) if req.metodo == "newton" else None,
+        "x0": float(req.x0),
+        "tol": float(req.tol),
+        "max_iter": int(req.max_iter),
+    }
+    return request_key("raices", payload)
+
 # --------- Endpoint ----------
 @router.post("/resolver", response_model=MetodoResponse)
-def resolver_metodo(req: MetodoRequest):
+def resolver_metodo(req: MetodoRequest, request: Request):
+    return response_cache.respond(
+        request, _clave_metodo(req),
+        lambda: _admitir_metodo(req, client_id_from(request)),
+    )
+
+@router.get("/resolver", response_model=MetodoResponse)
+def resolver_metodo_get(request: Request, req: MetodoRequest = Depends()):
+    """Misma operación por query string: el navegador la cachea y revalida con el ETag."""
+    return resolver_metodo(req, request)
+
+def _admitir_metodo(req: MetodoRequest, client_id: str) -> MetodoResponse:
+    costo = estimate_raices_cost(req.metodo, req.max_iter, req.fx, req.gx,
+                                 req.dfx if req.metodo == "newton" else None)
+    with admission.admit(client_id, costo) as deadline:
+        return _calcular_metodo(req, deadline)
+
+def _calcular_metodo(req: MetodoRequest, deadline=None) -> MetodoResponse:
     try:
         curva_f = curva_g = None
         grafico_g = None
@@ -89,7 +121,7 @@ def resolver_metodo(req: MetodoRequest):
             f = make_safe_func(req.fx)
             df = make_safe_func(req.dfx) if req.dfx else None
 
-            resultado, hist = run_newton(f, req.x0, df, req.tol, req.max_iter)
+            resultado, hist = run_newton(f, req.x0, df, req.tol, req.max_iter, deadline)
 
             # Iteraciones: agregamos x_{n+1} explícito
             iteraciones: List[Iteracion] = []
@@ -126,7 +158,7 @@ def resolver_metodo(req: MetodoRequest):
             if not req.gx:
                 raise HTTPException(status_code=400, detail="g(x) es requerido para Punto Fijo")
             g = make_safe_func(req.gx)
-            resultado, hist = run_punto_fijo(g, req.x0, req.tol, req.max_iter)
+            resultado, hist = run_punto_fijo(g, req.x0, req.tol, req.max_iter, deadline)
 
             xs = [h[1] for h in hist]
             xs_next = [h[2] for h in hist]
@@ -160,7 +192,7 @@ def resolver_metodo(req: MetodoRequest):
             if not req.gx:
                 raise HTTPException(status_code=400, detail="g(x) es requerido para Aitken")
             g = make_safe_func(req.gx)
-            resultado, hist = run_aitken(g, req.x0, req.tol, req.max_iter)
+            resultado, hist = run_aitken(g, req.x0, req.tol, req.max_iter, deadline)
             # Nuestro service guarda: (n, x, x_acc, err_abs, err_rel)
             # Para mostrar columnas como el original, calculamos x1=g(x) y x2=g(x1).
             iteraciones: List[Iteracion] = []
@@ -215,5 +247,9 @@ def resolver_metodo(req: MetodoRequest):
 
     except HTTPException:
         raise
+    except ExpressionLimitError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -12,6 +12,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Cache"],  # el front necesita leer el ETag de la caché
 )
 
 # Registrar rutas con prefijo /api
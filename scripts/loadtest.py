@@ -0,0 +1,520 @@
+"""
+Generador de carga end-to-end para la API.
+
+Levanta `main:app` con uvicorn en local (o usa un servidor ya corriendo con --url),
+reproduce un workload a concurrencia y tasa de llegada configurables y reporta
+req/s, latencias p50/p95/p99 por endpoint y método, tasa de errores y CPU/RSS
+del servidor.
+
+Formatos de workload aceptados:
+- .jsonl: una línea por request. Cada línea puede ser
+    {"path": "/api/integracion/resolver", "body": {...}}
+    {"requestBody": "<json como string>"}      (formato de los data files de Postman)
+    {...}                                       (el body directamente)
+  Si no hay path, se infiere por el método (integración -> /api/integracion/resolver).
+- Colección de Postman (v2.1): se toman los requests POST con body raw. Los que usan
+  la plantilla {{requestBody}} se expanden con los data files pasados junto a ella.
+- Data file de Postman: lista JSON de objetos con "requestBody".
+
+Ejemplos:
+    python scripts/loadtest.py postman_test/workload.jsonl --concurrency 16 --duration 30
+    python scripts/loadtest.py postman_test/coleccion.json postman_test/integration_cases.json \\
+        --workers 4 --rate 200 --duration 60 --json resultados.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import queue
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    import psutil  # opcional: sólo para medir CPU/RSS del servidor
+except ImportError:  # pragma: no cover
+    psutil = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INTEGRATION_PATH = "/api/integracion/resolver"
+ROOTS_PATH = "/api/resolver"
+ROOT_METHODS = {"newton", "punto_fijo", "aitken"}
+
+# Por defecto el servidor bajo prueba corre sin caché de respuestas y sin
+# presupuesto por cliente: todo el tráfico sale de una IP y se repite el mismo
+# workload, así que ambos distorsionarían la medición. Se pisan con --env.
+DEFAULT_SERVER_ENV = {
+    "CACHE_MAX_ITEMS": "0",
+    "CACHE_DB_PATH": "",
+    "CLIENT_BUDGET": "1e18",
+    "CLIENT_REFILL": "1e18",
+}
+
+
+# ---------- Carga del workload ----------
+
+Entry = Tuple[str, bytes, str]  # (path, body, metodo)
+
+
+def _infer_path(body: Dict) -> str:
+    return ROOTS_PATH if body.get("metodo") in ROOT_METHODS else INTEGRATION_PATH
+
+
+def _make_entry(path: Optional[str], body) -> Optional[Entry]:
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return None
+    if not isinstance(body, dict):
+        return None
+    if not path:
+        path = _infer_path(body)
+    path = "/" + path.split("}}", 1)[-1].lstrip("/") if "}}" in path else path
+    return path, json.dumps(body).encode("utf-8"), str(body.get("metodo", "-"))
+
+
+def _entry_from_record(rec: Dict) -> Optional[Entry]:
+    path = rec.get("path") or rec.get("url")
+    if path and "://" in path:
+        path = urlparse(path).path
+    for field in ("body", "json", "requestBody"):
+        if field in rec:
+            return _make_entry(path, rec[field])
+    return _make_entry(path, rec)
+
+
+def _collection_requests(items) -> List[Tuple[str, str]]:
+    """(path, raw_body) de todos los POST de una colección, recorriendo carpetas."""
+    out = []
+    for item in items:
+        if "item" in item:
+            out.extend(_collection_requests(item["item"]))
+            continue
+        req = item.get("request") or {}
+        if str(req.get("method", "")).upper() != "POST":
+            continue
+        url = req.get("url") or {}
+        if isinstance(url, dict):
+            path = "/" + "/".join(url.get("path") or []) if url.get("path") else url.get("raw", "")
+        else:
+            path = url
+        raw = (req.get("body") or {}).get("raw", "")
+        out.append((path, raw))
+    return out
+
+
+def load_workload(paths: List[str]) -> List[Entry]:
+    templates: List[Tuple[str, str]] = []
+    data_rows: List[Dict] = []
+    entries: List[Entry] = []
+
+    for p in paths:
+        if p.endswith(".jsonl"):
+            with open(p, encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = _entry_from_record(json.loads(line))
+                    if entry:
+                        entries.append(entry)
+            continue
+
+        with open(p, encoding="utf-8") as fh:
+            doc = json.load(fh)
+        if isinstance(doc, dict) and "item" in doc:
+            for path, raw in _collection_requests(doc["item"]):
+                if "{{" in raw:
+                    templates.append((path, raw))
+                else:
+                    entry = _make_entry(path, raw)
+                    if entry:
+                        entries.append(entry)
+        elif isinstance(doc, list):
+            data_rows.extend(r for r in doc if isinstance(r, dict))
+
+    for row in data_rows:
+        if templates:
+            for path, raw in templates:
+                for key, value in row.items():
+                    raw = raw.replace("{{%s}}" % key, str(value))
+                entry = _make_entry(path, raw)
+                if entry:
+                    entries.append(entry)
+        else:
+            entry = _entry_from_record(row)
+            if entry:
+                entries.append(entry)
+
+    return entries
+
+
+# ---------- Servidor ----------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(host: str, port: int, workers: int, env_overrides: Dict[str, str],
+                 server_args: List[str]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(DEFAULT_SERVER_ENV)
+    env.update(env_overrides)
+    cmd = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", host, "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ] + server_args
+    return subprocess.Popen(cmd, cwd=REPO_ROOT, env=env)
+
+
+def wait_ready(host: str, port: int, proc: Optional[subprocess.Popen], timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"uvicorn terminó con código {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/openapi.json")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+class ProcessMonitor:
+    """Muestrea CPU y RSS del proceso del servidor y de todos sus hijos (workers)."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Tuple[float, float, float]] = []  # (t, cpu_seconds, rss_bytes)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _tree_pids(self) -> List[int]:
+        if psutil is not None:
+            try:
+                root = psutil.Process(self.pid)
+                return [self.pid] + [c.pid for c in root.children(recursive=True)]
+            except psutil.Error:
+                return []
+        parents = defaultdict(list)
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat") as fh:
+                    fields = fh.read().rsplit(")", 1)[1].split()
+                parents[int(fields[1])].append(int(name))
+            except (OSError, IndexError):
+                continue
+        pids, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            pids.append(pid)
+            stack.extend(parents.get(pid, []))
+        return pids
+
+    def _usage(self, pid: int) -> Tuple[float, float]:
+        if psutil is not None:
+            try:
+                p = psutil.Process(pid)
+                t = p.cpu_times()
+                return t.user + t.system, float(p.memory_info().rss)
+            except psutil.Error:
+                return 0.0, 0.0
+        try:
+            with open(f"/proc/{pid}/stat") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+            ticks = os.sysconf("SC_CLK_TCK")
+            cpu = (int(fields[11]) + int(fields[12])) / ticks
+            rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+            return cpu, float(rss)
+        except (OSError, IndexError, ValueError):
+            return 0.0, 0.0
+
+    def sample(self) -> None:
+        cpu = rss = 0.0
+        for pid in self._tree_pids():
+            c, r = self._usage(pid)
+            cpu += c
+            rss += r
+        self.samples.append((time.monotonic(), cpu, rss))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def summary(self) -> Dict:
+        if len(self.samples) < 2:
+            return {}
+        (t0, c0, _), (t1, c1, _) = self.samples[0], self.samples[-1]
+        elapsed = max(t1 - t0, 1e-9)
+        return {
+            "cpu_seconds": c1 - c0,
+            "cpu_percent_avg": 100.0 * (c1 - c0) / elapsed,
+            "rss_mb_peak": max(s[2] for s in self.samples) / 2 ** 20,
+            "rss_mb_last": self.samples[-1][2] / 2 ** 20,
+        }
+
+
+# ---------- Generador de carga ----------
+
+class Result:
+    __slots__ = ("key", "latency", "status")
+
+    def __init__(self, key: Tuple[str, str], latency: float, status: str):
+        self.key = key
+        self.latency = latency
+        self.status = status
+
+
+def _worker(host: str, port: int, jobs: "queue.Queue", results: List[Result],
+            lock: threading.Lock, timeout: float) -> None:
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    headers = {"Content-Type": "application/json"}
+    local: List[Result] = []
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        scheduled, (path, body, metodo) = job
+        # Con tasa fija medimos desde el instante programado: así el tiempo en cola
+        # del cliente cuenta como latencia (evita el "coordinated omission").
+        start = scheduled if scheduled is not None else time.monotonic()
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            status = str(resp.status)
+            if resp.getheader("connection", "").lower() == "close":
+                conn.close()
+        except (OSError, http.client.HTTPException) as e:
+            status = type(e).__name__
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        local.append(Result((path, metodo), time.monotonic() - start, status))
+    conn.close()
+    with lock:
+        results.extend(local)
+
+
+def run_load(host: str, port: int, entries: List[Entry], concurrency: int,
+             rate: float, duration: float, max_requests: int, poisson: bool,
+             shuffle: bool, timeout: float) -> Tuple[List[Result], float]:
+    jobs: "queue.Queue" = queue.Queue(maxsize=max(1, concurrency * 4) if rate <= 0 else 0)
+    results: List[Result] = []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=_worker, args=(host, port, jobs, results, lock, timeout), daemon=True)
+        for _ in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+
+    order = list(range(len(entries)))
+    rng = random.Random(0)
+    start = time.monotonic()
+    next_at = start
+    sent = 0
+    while True:
+        if max_requests and sent >= max_requests:
+            break
+        if duration and time.monotonic() - start >= duration:
+            break
+        if shuffle and sent % len(order) == 0:
+            rng.shuffle(order)
+        entry = entries[order[sent % len(order)]]
+        if rate > 0:
+            next_at += rng.expovariate(rate) if poisson else 1.0 / rate
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            jobs.put((next_at, entry))
+        else:
+            jobs.put((None, entry))
+        sent += 1
+
+    for _ in threads:
+        jobs.put(None)
+    for t in threads:
+        t.join()
+    return results, time.monotonic() - start
+
+
+# ---------- Reporte ----------
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return float("nan")
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+def _stats(results: List[Result], elapsed: float) -> Dict:
+    lat = sorted(r.latency for r in results)
+    errors = defaultdict(int)
+    for r in results:
+        if not r.status.startswith("2"):
+            errors[r.status] += 1
+    n = len(results)
+    return {
+        "requests": n,
+        "rps": n / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": 1000 * _percentile(lat, 50),
+        "p95_ms": 1000 * _percentile(lat, 95),
+        "p99_ms": 1000 * _percentile(lat, 99),
+        "max_ms": 1000 * lat[-1] if lat else float("nan"),
+        "error_rate": sum(errors.values()) / n if n else 0.0,
+        "errors": dict(errors),
+    }
+
+
+def build_report(results: List[Result], elapsed: float, server: Dict, config: Dict) -> Dict:
+    by_key = defaultdict(list)
+    for r in results:
+        by_key[r.key].append(r)
+    return {
+        "config": config,
+        "elapsed_s": elapsed,
+        "total": _stats(results, elapsed),
+        "by_endpoint": [
+            dict(endpoint=path, metodo=metodo, **_stats(rs, elapsed))
+            for (path, metodo), rs in sorted(by_key.items())
+        ],
+        "server": server,
+    }
+
+
+def print_report(report: Dict) -> None:
+    header = f"{'endpoint':<28} {'metodo':<12} {'reqs':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err %':>6}"
+    print(header)
+    print("-" * len(header))
+    rows = report["by_endpoint"] + [dict(endpoint="TOTAL", metodo="", **report["total"])]
+    for row in rows:
+        print(
+            f"{row['endpoint']:<28} {row['metodo']:<12} {row['requests']:>7} {row['rps']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {100 * row['error_rate']:>6.2f}"
+        )
+    if report["total"]["errors"]:
+        print("errores:", ", ".join(f"{k}={v}" for k, v in sorted(report["total"]["errors"].items())))
+    server = report.get("server") or {}
+    if server:
+        print(
+            f"servidor: CPU {server['cpu_percent_avg']:.0f}% promedio "
+            f"({server['cpu_seconds']:.1f} s), RSS pico {server['rss_mb_peak']:.0f} MB"
+        )
+
+
+# ---------- CLI ----------
+
+def _parse_env(pairs: List[str]) -> Dict[str, str]:
+    env = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--env espera CLAVE=VALOR, se recibió {pair!r}")
+        env[key] = value
+    return env
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test end-to-end de la API de métodos numéricos")
+    parser.add_argument("workload", nargs="+", help="archivos .jsonl, colecciones o data files de Postman")
+    parser.add_argument("--url", help="usar un servidor ya levantado (no se inicia uvicorn)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 = puerto libre")
+    parser.add_argument("--workers", type=int, default=1, help="workers de uvicorn")
+    parser.add_argument("--server-arg", action="append", default=[],
+                        help="argumento extra para uvicorn (repetible), p. ej. --server-arg=--limit-concurrency=64")
+    parser.add_argument("--env", action="append", default=[],
+                        help="variable de entorno del servidor CLAVE=VALOR (repetible)")
+    parser.add_argument("--concurrency", type=int, default=8, help="conexiones cliente en paralelo")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="llegadas por segundo (0 = lazo cerrado, tan rápido como responda)")
+    parser.add_argument("--poisson", action="store_true", help="llegadas con intervalos exponenciales")
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos de medición")
+    parser.add_argument("--requests", type=int, default=0, help="cortar tras N requests (0 = sin límite)")
+    parser.add_argument("--warmup", type=float, default=2.0, help="segundos de calentamiento no medidos")
+    parser.add_argument("--timeout", type=float, default=60.0, help="timeout por request")
+    parser.add_argument("--no-shuffle", action="store_true", help="reproducir en el orden del archivo")
+    parser.add_argument("--json", help="guardar el reporte completo en este archivo")
+    args = parser.parse_args(argv)
+
+    entries = load_workload(args.workload)
+    if not entries:
+        print("El workload no tiene requests", file=sys.stderr)
+        return 2
+
+    proc = None
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        host, port = args.host, args.port or _free_port()
+        proc = start_server(host, port, args.workers, _parse_env(args.env), args.server_arg)
+
+    try:
+        wait_ready(host, port, proc)
+        common = dict(concurrency=args.concurrency, rate=args.rate, poisson=args.poisson,
+                      shuffle=not args.no_shuffle, timeout=args.timeout)
+        if args.warmup > 0:
+            run_load(host, port, entries, duration=args.warmup, max_requests=0, **common)
+
+        monitor = ProcessMonitor(proc.pid) if proc is not None else None
+        if monitor:
+            monitor.start()
+        results, elapsed = run_load(host, port, entries, duration=args.duration,
+                                    max_requests=args.requests, **common)
+        if monitor:
+            monitor.stop()
+
+        config = {
+            "workload": args.workload,
+            "entries": len(entries),
+            "workers": None if args.url else args.workers,
+            "server_args": args.server_arg,
+            "env": _parse_env(args.env),
+            **{k: v for k, v in common.items() if k != "timeout"},
+        }
+        report = build_report(results, elapsed, monitor.summary() if monitor else {}, config)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,9 @@
-def run_aitken(g, x0, tol=1e-8, max_iter=50):
+def run_aitken(g, x0, tol=1e-8, max_iter=50, deadline=None):
     history = []
     x = x0
     for n in range(max_iter):
+        if deadline:
+            deadline.check()
         x1 = g(x)
         x2 = g(x1)
         denom = x2 - 2 * x1 + x
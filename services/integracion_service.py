@@ -1,6 +1,10 @@
 from typing import Callable, Dict, List, Tuple, Optional
+from operator import mul
 import math
 
+from utils.safe_eval import ExpressionLimitError
+from utils.newton_cotes import RULES, adjust_n, composite_weights
+
 # ---------- Helpers comunes ----------
 
 def linspace(a: float, b: float, n: int) -> List[float]:
@@ -44,6 +48,9 @@ def safe_f(f: Callable[[float], float], x: float) -> float:
         y = f(x)
         if _is_finite(y):
             return float(y)
+    except ExpressionLimitError:
+        # No es una singularidad: el operando es demasiado grande
+        raise
     except ZeroDivisionError:
         pass
     except Exception:
@@ -60,6 +67,14 @@ def safe_f(f: Callable[[float], float], x: float) -> float:
         return 0.0
     return float(y) if _is_finite(y) else 0.0
 
+def _eval_nodes(f: Callable[[float], float], xs: List[float], deadline=None) -> List[float]:
+    fxs = []
+    for x in xs:
+        if deadline:
+            deadline.check()
+        fxs.append(safe_f(f, x))
+    return fxs
+
 def sample_curve(f: Callable[[float], float], a: float, b: float, samples: int = 401) -> List[Tuple[float, Optional[float]]]:
     if samples < 2:
         samples = 2
@@ -89,7 +104,7 @@ def _points_to_payload(indices, xs, fxs, coefs, contribs) -> List[Dict]:
 
 # ---------- Métodos compuestos ----------
 
-def run_rectangulo(f: Callable[[float], float], a: float, b: float, n: int) -> Dict:
+def run_rectangulo(f: Callable[[float], float], a: float, b: float, n: int, deadline=None) -> Dict:
     """Regla del rectángulo (punto medio) compuesta."""
     if n < 1:
         n = 1
@@ -97,6 +112,8 @@ def run_rectangulo(f: Callable[[float], float], a: float, b: float, n: int) -> D
     indices, xs, fxs, contribs = [], [], [], []
     total = 0.0
     for i in range(n):
+        if deadline:
+            deadline.check()
         xm = (a + i * h + a + (i + 1) * h) / 2.0
         fx = safe_f(f, xm)
         contrib = fx * h
@@ -108,95 +125,108 @@ def run_rectangulo(f: Callable[[float], float], a: float, b: float, n: int) -> D
     points = _points_to_payload(indices, xs, fxs, [1.0] * n, contribs)
     return {"value": float(total), "h": h, "evals": n, "points": points}
 
-def run_trapezoidal(f: Callable[[float], float], a: float, b: float, n: int) -> Dict:
-    """Regla trapezoidal compuesta."""
-    if n < 1:
-        n = 1
-    xs = linspace(a, b, n)
+def _run_composite(metodo: str, f: Callable[[float], float], a: float, b: float, n: int, deadline=None) -> Dict:
+    """
+    Regla compuesta genérica: los pesos salen del motor de Newton–Cotes (el panel
+    reducido queda cacheado por regla) y la integral es un único producto escalar con los f(x_i).
+    """
+    rule = RULES[metodo]
+    n = adjust_n(rule, n)
+    w = composite_weights(rule, n)
     h = (b - a) / n
-    fxs = [safe_f(f, x) for x in xs]
-    coefs = [1.0] + [2.0] * (n - 1) + [1.0]
-    contribs = [fx * c * (h / 2.0) for fx, c in zip(fxs, coefs)]
-    total = sum(contribs)
-    points = _points_to_payload(range(len(xs)), xs, fxs, coefs, contribs)
+    xs = [a + i * h for i in w.nodes]
+    fxs = _eval_nodes(f, xs, deadline)
+    coefs = w.coefs if len(w.nodes) == len(w.coefs) else [w.coefs[i] for i in w.nodes]
+    scale = w.scale(h)
+    total = sum(map(mul, coefs, fxs)) * scale
+    contribs = [fx * c * scale for fx, c in zip(fxs, coefs)]
+    points = _points_to_payload(w.nodes, xs, fxs, coefs, contribs)
     return {"value": float(total), "h": h, "evals": len(xs), "points": points}
 
-def run_simpson_13(f: Callable[[float], float], a: float, b: float, n: int) -> Dict:
+def run_trapezoidal(f: Callable[[float], float], a: float, b: float, n: int, deadline=None) -> Dict:
+    """Regla trapezoidal compuesta."""
+    return _run_composite("trapezoidal", f, a, b, n, deadline)
+
+def run_simpson_13(f: Callable[[float], float], a: float, b: float, n: int, deadline=None) -> Dict:
     """Simpson 1/3 compuesta: n debe ser par (se ajusta si no lo es)."""
-    if n < 2:
-        n = 2
-    if n % 2 != 0:
-        n += 1
-    xs = linspace(a, b, n)
-    h = (b - a) / n
-    fxs = [safe_f(f, x) for x in xs]
-    coefs = []
-    for i in range(len(xs)):
-        if i == 0 or i == n:
-            coefs.append(1.0)
-        elif i % 2 == 1:
-            coefs.append(4.0)
-        else:
-            coefs.append(2.0)
-    contribs = [fx * c * (h / 3.0) for fx, c in zip(fxs, coefs)]
-    total = sum(contribs)
-    points = _points_to_payload(range(len(xs)), xs, fxs, coefs, contribs)
-    return {"value": float(total), "h": h, "evals": len(xs), "points": points}
+    return _run_composite("simpson_13", f, a, b, n, deadline)
 
-def run_simpson_38(f: Callable[[float], float], a: float, b: float, n: int) -> Dict:
+def run_simpson_38(f: Callable[[float], float], a: float, b: float, n: int, deadline=None) -> Dict:
     """Simpson 3/8 compuesta: n múltiplo de 3 (se ajusta)."""
-    if n < 3:
-        n = 3
-    if n % 3 != 0:
-        n = ((n // 3) + 1) * 3
-    xs = linspace(a, b, n)
-    h = (b - a) / n
-    fxs = [safe_f(f, x) for x in xs]
-    coefs = []
-    for i in range(len(xs)):
-        if i == 0 or i == n:
-            coefs.append(1.0)
-        elif i % 3 == 0:
-            coefs.append(2.0)
-        else:
-            coefs.append(3.0)
-    contribs = [fx * c * (3.0 * h / 8.0) for fx, c in zip(fxs, coefs)]
-    total = sum(contribs)
-    points = _points_to_payload(range(len(xs)), xs, fxs, coefs, contribs)
-    return {"value": float(total), "h": h, "evals": len(xs), "points": points}
+    return _run_composite("simpson_38", f, a, b, n, deadline)
 
-def run_boole(f: Callable[[float], float], a: float, b: float, n: int) -> Dict:
+def run_boole(f: Callable[[float], float], a: float, b: float, n: int, deadline=None) -> Dict:
     """Regla de Boole compuesta: n múltiplo de 4 (se ajusta)."""
-    if n < 4:
-        n = 4
-    if n % 4 != 0:
-        n = ((n // 4) + 1) * 4
-    xs = linspace(a, b, n)
-    h = (b - a) / n
-    fxs = [safe_f(f, x) for x in xs]
-
-    coefs = []
-    for i in range(len(xs)):
-        if i == 0 or i == n:
-            coefs.append(7.0)
-        elif i % 4 == 0:
-            coefs.append(14.0)
-        elif i % 2 == 0:
-            coefs.append(12.0)
-        else:
-            coefs.append(32.0)
-
-    contribs = [fx * c * (2.0 * h / 45.0) for fx, c in zip(fxs, coefs)]
-    total = sum(contribs)
-    points = _points_to_payload(range(len(xs)), xs, fxs, coefs, contribs)
-    return {"value": float(total), "h": h, "evals": len(xs), "points": points}
+    return _run_composite("boole", f, a, b, n, deadline)
+
+def run_weddle(f: Callable[[float], float], a: float, b: float, n: int, deadline=None) -> Dict:
+    """Regla de Weddle compuesta: n múltiplo de 6 (se ajusta)."""
+    return _run_composite("weddle", f, a, b, n, deadline)
+
+# ---------- Estudio de convergencia (grillas anidadas) ----------
+
+def run_convergencia(f: Callable[[float], float], a: float, b: float, metodo: str,
+                     n0: int, niveles: int, deadline=None) -> Dict:
+    """
+    Evalúa la regla compuesta con n0, 2·n0, 4·n0, ... Cada grilla contiene a la
+    anterior, así que en cada nivel sólo se evalúan los nodos nuevos (índices
+    impares); el total de evaluaciones es el de la grilla más fina.
+    """
+    rule = RULES[metodo]
+    order = rule.order
+    n = adjust_n(rule, n0)
+    fxs = _eval_nodes(f, linspace(a, b, n), deadline)
+    evals = len(fxs)
+    new_evals = evals
+
+    levels = []
+    prev_value = prev_diff = None
+    for k in range(niveles):
+        if k > 0:
+            n *= 2
+            h = (b - a) / n
+            new_fxs = _eval_nodes(f, [a + i * h for i in range(1, n, 2)], deadline)
+            merged = [0.0] * (n + 1)
+            merged[0::2] = fxs
+            merged[1::2] = new_fxs
+            fxs = merged
+            new_evals = len(new_fxs)
+            evals += new_evals
+
+        h = (b - a) / n
+        w = composite_weights(rule, n)
+        value = float(sum(map(mul, w.coefs, fxs)) * w.scale(h))
+
+        error_estimate = observed_order = None
+        if prev_value is not None:
+            diff = value - prev_value
+            # Richardson: I - I_h ≈ (I_h - I_2h) / (2^p - 1)
+            error_estimate = abs(diff) / (2 ** order - 1)
+            if prev_diff is not None and diff != 0 and prev_diff != 0:
+                observed_order = math.log2(abs(prev_diff) / abs(diff))
+            prev_diff = diff
+        prev_value = value
+
+        levels.append({
+            "n": n,
+            "h": h,
+            "value": value,
+            "new_evals": new_evals,
+            "evals": evals,
+            "error_estimate": error_estimate,
+            "observed_order": observed_order,
+        })
+
+    return {"value": prev_value, "evals": evals, "order": order, "levels": levels}
 
 # ---------- Método adaptativo (Simpson recursivo) ----------
 
 def _simpson_panel(f, a, b, fa, fm, fb) -> float:
     return (b - a) * (fa + 4.0 * fm + fb) / 6.0
 
-def _adaptive_recursive(f, a, b, fa, fm, fb, S, tol, depth, evals) -> Tuple[float, float, int]:
+def _adaptive_recursive(f, a, b, fa, fm, fb, S, tol, depth, evals, deadline=None) -> Tuple[float, float, int]:
+    if deadline:
+        deadline.check()
     c = (a + b) / 2.0
     fd = safe_f(f, (a + c) / 2.0); evals += 1
     fe = safe_f(f, (c + b) / 2.0); evals += 1
@@ -209,21 +239,21 @@ def _adaptive_recursive(f, a, b, fa, fm, fb, S, tol, depth, evals) -> Tuple[floa
         return S_left + S_right + err, err, evals
 
     left_val, left_err, evals = _adaptive_recursive(
-        f, a, c, fa, fd, fm, S_left, tol / 2.0, depth + 1, evals
+        f, a, c, fa, fd, fm, S_left, tol / 2.0, depth + 1, evals, deadline
     )
     right_val, right_err, evals = _adaptive_recursive(
-        f, c, b, fm, fe, fb, S_right, tol / 2.0, depth + 1, evals
+        f, c, b, fm, fe, fb, S_right, tol / 2.0, depth + 1, evals, deadline
     )
     return left_val + right_val, max(abs(left_err), abs(right_err)), evals
 
-def run_adaptativo(f: Callable[[float], float], a: float, b: float, tol: float) -> Dict:
+def run_adaptativo(f: Callable[[float], float], a: float, b: float, tol: float, deadline=None) -> Dict:
     fa = safe_f(f, a)
     fm = safe_f(f, (a + b) / 2.0)
     fb = safe_f(f, b)
     evals = 3
 
     S = _simpson_panel(f, a, b, fa, fm, fb)
-    value, err_est, evals = _adaptive_recursive(f, a, b, fa, fm, fb, S, tol, 0, evals)
+    value, err_est, evals = _adaptive_recursive(f, a, b, fa, fm, fb, S, tol, 0, evals, deadline)
 
     # Para tener una tabla mínima con el panel base
     points = _points_to_payload(
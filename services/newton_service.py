@@ -1,9 +1,11 @@
 from utils.derivative import numerical_derivative
 
-def run_newton(f, x0, df=None, tol=1e-8, max_iter=50):
+def run_newton(f, x0, df=None, tol=1e-8, max_iter=50, deadline=None):
     history = []
     x = x0
     for n in range(max_iter):
+        if deadline:
+            deadline.check()
         fx = f(x)
         dfx = df(x) if df else numerical_derivative(f, x)
         if abs(dfx) < 1e-14:
@@ -1,7 +1,9 @@
-def run_punto_fijo(g, x0, tol=1e-8, max_iter=50):
+def run_punto_fijo(g, x0, tol=1e-8, max_iter=50, deadline=None):
     history = []
     x = x0
     for n in range(max_iter):
+        if deadline:
+            deadline.check()
         x_next = g(x)
         abs_err = abs(x_next - x)
         rel_err = abs_err / abs(x_next) if x_next != 0 else float('inf')
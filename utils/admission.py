@@ -0,0 +1,259 @@
+import ast
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from fastapi import HTTPException
+
+from utils.newton_cotes import RULES
+
+# Unidades de costo ≈ evaluaciones de f(x) × nodos del AST de la expresión.
+CURVE_SAMPLES = 401        # puntos de las curvas que se devuelven al front
+PAYLOAD_COST = 10          # armar y serializar cada fila de la tabla de puntos
+SYMBOLIC_COST = 50000      # SymPy (solve + limit): costo fijo, acotado por SYMBOLIC_TIMEOUT
+ADAPTIVE_MAX_EVALS = 200000
+MAX_TRACKED_CLIENTS = 10000
+
+
+class DeadlineExceeded(TimeoutError):
+    """El cálculo superó el tiempo máximo asignado al request."""
+
+
+class Deadline:
+    """Deadline cooperativo: los bucles de los services llaman a check()."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def check(self) -> None:
+        if time.monotonic() > self.expires:
+            raise DeadlineExceeded(f"Se superó el tiempo máximo de cálculo ({self.seconds:g} s)")
+
+
+# ---------- Estimación de costo ----------
+
+def expression_complexity(expr: Optional[str]) -> int:
+    """Cantidad de nodos del AST; las potencias pesan más por su costo relativo."""
+    if not expr:
+        return 0
+    try:
+        tree = ast.parse(expr.replace("^", "**"), mode="eval")
+    except Exception:
+        return max(1, len(expr))
+    total = 0
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Pow):
+            total += 4
+        elif isinstance(node, ast.Call):
+            total += 2
+        else:
+            total += 1
+    return total
+
+
+def _composite_evals(metodo: str, n: int) -> int:
+    if metodo == "rectangulo":
+        return n
+    return n + 1
+
+
+def _adaptive_evals(tol: float) -> int:
+    # Simpson adaptativo: el error local escala con h^4 => paneles ~ tol^(-1/4)
+    tol = max(tol, 1e-300)
+    return int(min(ADAPTIVE_MAX_EVALS, 10.0 * tol ** -0.25))
+
+
+def estimate_integracion_cost(metodo: str, fx: str, n: int, tol: float) -> float:
+    cx = max(1, expression_complexity(fx))
+    if metodo == "adaptativo":
+        # La tabla del adaptativo es sólo el panel base: no hay costo de payload por nodo
+        work = _adaptive_evals(tol) * cx
+    else:
+        work = _composite_evals(metodo, n) * (cx + PAYLOAD_COST)
+    return float(work + CURVE_SAMPLES * cx + SYMBOLIC_COST)
+
+
+def estimate_convergencia_cost(metodo: str, fx: str, n0: int, niveles: int) -> float:
+    # Con grillas anidadas el total de evaluaciones es el de la grilla más fina;
+    # se responde una fila por nivel, no una por nodo.
+    cx = max(1, expression_complexity(fx))
+    mult = RULES[metodo].m if metodo in RULES else 1
+    n_max = math.ceil(max(int(n0), 1) / mult) * mult * 2 ** max(0, int(niveles) - 1)
+    return float((n_max + 1) * cx + SYMBOLIC_COST)
+
+
+def estimate_raices_cost(metodo: str, max_iter: int, fx: Optional[str] = None,
+                         gx: Optional[str] = None, dfx: Optional[str] = None) -> float:
+    cf = expression_complexity(fx)
+    cg = expression_complexity(gx)
+    cd = expression_complexity(dfx)
+    iters = max(0, int(max_iter))
+    if metodo == "newton":
+        # f(x) + f'(x) (analítica o diferencia central con 2 evaluaciones) + punto graficado
+        per_iter = 2 * cf + (cd if dfx else 2 * cf)
+    elif metodo == "punto_fijo":
+        per_iter = 2 * cg + cf
+    else:
+        # Aitken: g(g(x)) en el service y de nuevo en el controller para la tabla
+        per_iter = 5 * cg + cf
+    curves = CURVE_SAMPLES * (cf + cg)
+    return float(iters * (max(1, per_iter) + PAYLOAD_COST) + curves)
+
+
+# ---------- Control de admisión ----------
+
+class _TokenBucket:
+    def __init__(self, capacity: float, refill: float):
+        self.capacity = capacity
+        self.refill = refill
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill)
+        self.updated = now
+
+    def take(self, amount: float) -> Optional[float]:
+        """Consume `amount`; si no alcanza devuelve los segundos de espera sugeridos."""
+        self._refill(time.monotonic())
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return None
+        if self.refill <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.refill
+
+    def give_back(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdmissionController:
+    """
+    Admisión basada en costo estimado.
+
+    - max_request_cost: tope por request (400 si se excede; reintentar no ayuda).
+    - client_budget / client_refill: token bucket por cliente (429 + Retry-After).
+    - max_inflight_cost: costo total en ejecución por worker; el exceso espera
+      en cola hasta queue_timeout segundos y luego recibe 503.
+    - max_waiters: lugares en esa cola. Cada espera ocupa un hilo del threadpool
+      de FastAPI (los endpoints son sync), así que con la cola llena se responde
+      503 de inmediato para no dejar sin hilos a los requests baratos.
+    - deadline: segundos máximos de cálculo, chequeados cooperativamente.
+    """
+
+    def __init__(self, max_request_cost: float = 5e6, client_budget: float = 2e7,
+                 client_refill: float = 2e6, max_inflight_cost: float = 2e7,
+                 queue_timeout: float = 2.0, deadline: float = 10.0,
+                 max_waiters: int = 8):
+        self.max_request_cost = max_request_cost
+        self.client_budget = max(client_budget, max_request_cost)
+        self.client_refill = client_refill
+        self.max_inflight_cost = max(max_inflight_cost, max_request_cost)
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        self.max_waiters = max(0, int(max_waiters))
+        self._buckets: "OrderedDict[str, _TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._inflight = 0.0
+        self._waiters = 0
+
+    def _take_client_budget(self, client_id: str, cost: float) -> None:
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                if len(self._buckets) >= MAX_TRACKED_CLIENTS:
+                    self._prune_buckets()
+                bucket = self._buckets[client_id] = _TokenBucket(self.client_budget, self.client_refill)
+            else:
+                self._buckets.move_to_end(client_id)
+            wait = bucket.take(cost)
+        if wait is not None:
+            retry = "3600" if math.isinf(wait) else str(max(1, math.ceil(wait)))
+            raise HTTPException(
+                status_code=429,
+                detail="Presupuesto de cálculo del cliente agotado; reintentá más tarde",
+                headers={"Retry-After": retry},
+            )
+
+    def _prune_buckets(self) -> None:
+        # Un bucket lleno equivale a uno nuevo: se puede descartar sin perder estado
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            bucket._refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[key]
+        # Si no alcanzó (muchos clientes activos), se descartan los menos recientes
+        while len(self._buckets) >= MAX_TRACKED_CLIENTS:
+            self._buckets.popitem(last=False)
+
+    def _refund(self, client_id: str, cost: float) -> None:
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is not None:
+                bucket.give_back(cost)
+
+    @contextmanager
+    def admit(self, client_id: str, cost: float) -> Iterator[Deadline]:
+        if cost > self.max_request_cost:
+            raise HTTPException(
+                status_code=400,
+                detail=f"El cálculo pedido es demasiado costoso (costo estimado {cost:.3g}, "
+                       f"máximo {self.max_request_cost:.3g}); reducí n, max_iter o la expresión",
+            )
+        self._take_client_budget(client_id, cost)
+
+        with self._cond:
+            admitted = self._inflight + cost <= self.max_inflight_cost
+            if not admitted and self._waiters < self.max_waiters:
+                self._waiters += 1
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self._inflight + cost <= self.max_inflight_cost,
+                        timeout=self.queue_timeout,
+                    )
+                finally:
+                    self._waiters -= 1
+            if admitted:
+                self._inflight += cost
+        if not admitted:
+            self._refund(client_id, cost)
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado; reintentá en unos segundos",
+                headers={"Retry-After": str(max(1, math.ceil(self.queue_timeout)))},
+            )
+
+        try:
+            yield Deadline(self.deadline)
+        finally:
+            with self._cond:
+                self._inflight -= cost
+                self._cond.notify_all()
+
+
+def client_id_from(request) -> str:
+    # Detrás de un proxy, uvicorn --proxy-headers reemplaza request.client por la IP
+    # de X-Forwarded-For; sin eso todos los usuarios comparten el bucket del proxy
+    return request.client.host if request.client else "anon"
+
+
+def _admission_from_env() -> AdmissionController:
+    return AdmissionController(
+        max_request_cost=float(os.getenv("MAX_REQUEST_COST", "5e6")),
+        client_budget=float(os.getenv("CLIENT_BUDGET", "2e7")),
+        client_refill=float(os.getenv("CLIENT_REFILL", "2e6")),
+        max_inflight_cost=float(os.getenv("MAX_INFLIGHT_COST", "2e7")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2")),
+        deadline=float(os.getenv("EVAL_DEADLINE", "10")),
+        max_waiters=int(os.getenv("ADMISSION_MAX_WAITERS", "8")),
+    )
+
+
+# Instancia compartida por los controllers (configurable por variables de entorno)
+admission = _admission_from_env()
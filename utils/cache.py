@@ -0,0 +1,244 @@
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+# Se incrementa cuando cambia el formato o el cálculo de las respuestas,
+# así las entradas viejas del disco dejan de coincidir (los ETag salen del body).
+CACHE_VERSION = "2"
+
+
+def normalize_expression(expr: Optional[str]) -> Optional[str]:
+    """
+    Forma canónica de una expresión: '^' -> '**' y re-impresión desde el AST,
+    de modo que 'x ^ 2' y 'x**2' produzcan la misma clave.
+    Si no parsea, se devuelve el texto recortado (la validación real ocurre después).
+    """
+    if expr is None:
+        return None
+    expr = expr.replace("^", "**").strip()
+    try:
+        return ast.unparse(ast.parse(expr, mode="eval"))
+    except Exception:
+        return expr
+
+
+def request_key(namespace: str, payload: Dict) -> str:
+    """Hash SHA-256 del request normalizado (JSON con claves ordenadas)."""
+    canonical = json.dumps(
+        {"v": CACHE_VERSION, "ns": namespace, "req": payload},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def _serialize(result: object) -> bytes:
+    # Para modelos pydantic usamos su serializador nativo (el mismo que usa FastAPI
+    # con response_model); jsonable_encoder es mucho más lento con tablas grandes.
+    if isinstance(result, BaseModel):
+        return result.model_dump_json().encode("utf-8")
+    return json.dumps(
+        jsonable_encoder(result),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class ResponseCache:
+    """
+    Caché de respuestas direccionada por contenido.
+
+    - Nivel 1: LRU en memoria (por proceso), acotado por entradas y por bytes.
+    - Nivel 2 (opcional): SQLite en disco con TTL y topes de entradas y bytes; sobrevive
+      reinicios y se comparte entre workers de uvicorn que apunten al mismo archivo.
+
+    Los bodies de más de max_entry_bytes no se cachean en ningún nivel
+    (0 = sin tope en cualquiera de los límites).
+    """
+
+    def __init__(self, max_items: int = 256, db_path: Optional[str] = None,
+                 ttl: float = 3600.0, max_db_items: int = 5000,
+                 max_bytes: int = 64 * 2 ** 20, max_db_bytes: int = 512 * 2 ** 20,
+                 max_entry_bytes: int = 4 * 2 ** 20):
+        self.max_items = max(0, int(max_items))
+        self.db_path = db_path or None
+        self.ttl = float(ttl)
+        self.max_db_items = max(0, int(max_db_items))
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_db_bytes = max(0, int(max_db_bytes))
+        self.max_entry_bytes = max(0, int(max_entry_bytes))
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        if self.db_path:
+            self._init_db()
+
+    # ---------- SQLite ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5.0)
+
+    def _init_db(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " body BLOB NOT NULL,"
+                " created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses(created)")
+
+    def _db_get(self, key: str) -> Optional[bytes]:
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT body, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                body, created = row
+                if self.ttl > 0 and time.time() - created > self.ttl:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                return bytes(body)
+        except sqlite3.Error:
+            # El disco es un nivel opcional: ante fallos se sigue sin él
+            return None
+
+    def _db_set(self, key: str, body: bytes) -> None:
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, body, created) VALUES (?, ?, ?)",
+                    (key, body, now),
+                )
+                if self.ttl > 0:
+                    conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                if self.max_db_items > 0:
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        " SELECT key FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                        (self.max_db_items,),
+                    )
+                if self.max_db_bytes > 0:
+                    # Acumulado de tamaños de la más nueva a la más vieja: se borra lo que no entra
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        " SELECT key FROM ("
+                        "  SELECT key, SUM(LENGTH(body)) OVER (ORDER BY created DESC, key) AS acc"
+                        "  FROM responses)"
+                        " WHERE acc > ?)",
+                        (self.max_db_bytes,),
+                    )
+        except sqlite3.Error:
+            pass
+
+    # ---------- API ----------
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._mem.get(key)
+            if body is not None:
+                self._mem.move_to_end(key)
+                return body
+        if self.db_path:
+            body = self._db_get(key)
+            if body is not None:
+                self._mem_set(key, body)
+            return body
+        return None
+
+    def _mem_set(self, key: str, body: bytes) -> None:
+        if self.max_items == 0:
+            return
+        if self.max_bytes > 0 and len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            self._mem[key] = body
+            self._mem_bytes += len(body)
+            while len(self._mem) > self.max_items or (
+                self.max_bytes > 0 and self._mem_bytes > self.max_bytes
+            ):
+                _, evicted = self._mem.popitem(last=False)
+                self._mem_bytes -= len(evicted)
+
+    def set(self, key: str, body: bytes) -> None:
+        if self.max_entry_bytes > 0 and len(body) > self.max_entry_bytes:
+            return
+        self._mem_set(key, body)
+        if self.db_path:
+            self._db_set(key, body)
+
+    def respond(self, request: Request, key: str, compute: Callable[[], object]) -> Response:
+        """
+        Devuelve la respuesta cacheada para `key`, o la calcula con `compute()`.
+        El ETag es un hash del body, no de la clave: si cambia el cálculo, el ETag
+        cambia aunque nadie incremente CACHE_VERSION. If-None-Match se compara recién
+        con el body en mano, así un request inválido sigue dando su error y '*' sólo
+        coincide si hay representación. Según RFC 9110 §13.1.2 una coincidencia es
+        304 en GET/HEAD y 412 en los demás métodos (POST): el cliente ya tiene la
+        versión vigente.
+        """
+        body = self.get(key)
+        if body is not None:
+            x_cache = "HIT"
+        else:
+            body = _serialize(compute())
+            self.set(key, body)
+            x_cache = "MISS"
+
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        headers = {"ETag": etag, "X-Cache": x_cache}
+        safe_method = request.method in ("GET", "HEAD")
+        if safe_method:
+            # El navegador guarda la respuesta y la revalida con If-None-Match
+            headers["Cache-Control"] = "no-cache"
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304 if safe_method else 412, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _cache_from_env() -> ResponseCache:
+    return ResponseCache(
+        max_items=int(os.getenv("CACHE_MAX_ITEMS", "256")),
+        db_path=os.getenv("CACHE_DB_PATH") or None,
+        ttl=float(os.getenv("CACHE_TTL", "3600")),
+        max_db_items=int(os.getenv("CACHE_DB_MAX_ITEMS", "5000")),
+        max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(64 * 2 ** 20))),
+        max_db_bytes=int(os.getenv("CACHE_DB_MAX_BYTES", str(512 * 2 ** 20))),
+        max_entry_bytes=int(os.getenv("CACHE_MAX_ENTRY_BYTES", str(4 * 2 ** 20))),
+    )
+
+
+# Instancia compartida por los controllers (configurable por variables de entorno)
+response_cache = _cache_from_env()
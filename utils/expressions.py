@@ -1,6 +1,10 @@
+import ast
 import math
+import multiprocessing
+import os
 import re
 from .lhopital import LHopitalAnalyzer
+from .safe_eval import GUARDED_NAMES, check_allowed_nodes, guard_ast
 
 def make_safe_function(expr: str, lhopital_points: dict = None):
     """
@@ -11,9 +15,12 @@ def make_safe_function(expr: str, lhopital_points: dict = None):
     expr = expr.replace("^", "**")
 
     allowed_names = {k: getattr(math, k) for k in dir(math) if not k.startswith("__")}
-    allowed_names.update({"abs": abs, "pow": pow, "pi": math.pi, "e": math.e})
+    allowed_names.update({"abs": abs, "pi": math.pi, "e": math.e})
+    allowed_names.update(GUARDED_NAMES)
 
-    code = compile(expr, "<string>", "eval")
+    expr_ast = ast.parse(expr, mode="eval")
+    check_allowed_nodes(expr_ast, allowed_names)
+    code = compile(guard_ast(expr_ast), "<string>", "eval")
 
     def f(x: float) -> float:
         if lhopital_points and x in lhopital_points:
@@ -22,12 +29,65 @@ def make_safe_function(expr: str, lhopital_points: dict = None):
 
     return f
 
-def check_for_singularities(expr: str, a: float, b: float):
+# Segundos máximos del análisis simbólico (0 = sin tope, en el mismo proceso).
+# sp.solve no se puede interrumpir y con denominadores de grado alto tarda minutos
+# (1/(x**16+x**7-3), 1/(x**100000-1)), así que corre en un proceso aparte que se mata.
+SYMBOLIC_TIMEOUT = float(os.getenv("SYMBOLIC_TIMEOUT", "2"))
+
+def _symbolic_context():
+    # fork: el hijo hereda SymPy ya importado y con sus cachés, así que arrancar cuesta
+    # milisegundos. Si heredara un lock tomado por otro hilo, el timeout lo mata igual.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+_ctx = _symbolic_context()
+
+def _singularities_worker(conn, expr: str, a: float, b: float) -> None:
+    try:
+        conn.send((True, _find_singularities(expr, a, b)))
+    except Exception as e:
+        conn.send((False, e))
+    finally:
+        conn.close()
+
+def check_for_singularities(expr: str, a: float, b: float, timeout: float = None):
     """
     Revisa si hay puntos singulares tipo 0/0 en [a,b].
     Usa LHopitalAnalyzer para calcular límites removibles.
     Devuelve (has_singularity, [(xcrit, limit)], message)
+    Si el análisis supera `timeout` segundos se abandona sin puntos críticos:
+    la integración sigue con el límite numérico de safe_f.
     """
+    timeout = SYMBOLIC_TIMEOUT if timeout is None else timeout
+    if timeout <= 0:
+        return _find_singularities(expr, a, b)
+
+    recv, send = _ctx.Pipe(duplex=False)
+    proc = _ctx.Process(target=_singularities_worker, args=(send, expr, a, b), daemon=True)
+    proc.start()
+    send.close()
+    result = None
+    try:
+        if recv.poll(timeout):
+            result = recv.recv()
+    except EOFError:
+        # El proceso murió sin responder (p. ej. sin memoria)
+        pass
+    finally:
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+        recv.close()
+
+    if result is None:
+        return False, [], "Análisis simbólico omitido: superó el tiempo máximo."
+    ok, payload = result
+    if not ok:
+        raise payload
+    return payload
+
+def _find_singularities(expr: str, a: float, b: float):
     analyzer = LHopitalAnalyzer(expr)
     critical_points = analyzer.find_critical_points(a, b)
 
@@ -0,0 +1,143 @@
+from fractions import Fraction
+from functools import lru_cache
+from math import gcd
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+
+class WeightedRule(NamedTuple):
+    """
+    Regla de un panel de m subintervalos de ancho h.
+    `panel` tiene m+1 pesos en unidades de h (nodos t=0..m); las reglas abiertas
+    llevan peso 0 en los extremos. `order` es el orden del error compuesto (O(h^order)).
+    """
+    panel: Tuple[Fraction, ...]
+    order: int
+
+    @property
+    def m(self) -> int:
+        return len(self.panel) - 1
+
+
+def _poly_mul(p: List[Fraction], q: List[Fraction]) -> List[Fraction]:
+    out = [Fraction(0)] * (len(p) + len(q) - 1)
+    for i, a in enumerate(p):
+        for j, b in enumerate(q):
+            out[i + j] += a * b
+    return out
+
+
+def _lagrange_weights(nodes: Sequence[int], m: int) -> List[Fraction]:
+    """w_j = ∫_0^m L_j(t) dt, exacto con fracciones."""
+    weights = []
+    for j, tj in enumerate(nodes):
+        poly = [Fraction(1)]
+        denom = Fraction(1)
+        for k, tk in enumerate(nodes):
+            if k != j:
+                poly = _poly_mul(poly, [Fraction(-tk), Fraction(1)])
+                denom *= tj - tk
+        integral = sum(c * Fraction(m) ** (p + 1) / (p + 1) for p, c in enumerate(poly))
+        weights.append(integral / denom)
+    return weights
+
+
+@lru_cache(maxsize=None)
+def newton_cotes(m: int, closed: bool = True) -> WeightedRule:
+    """
+    Regla de Newton–Cotes sobre [0, m·h].
+    Cerrada: nodos t=0..m (m >= 1).
+    Abierta (closed=False): nodos t=1..m-1 (m >= 2; m=2 es el punto medio).
+    """
+    if not closed:
+        if m < 2:
+            raise ValueError("Una regla abierta necesita m >= 2")
+        nodes = list(range(1, m))
+        panel = (Fraction(0),) + tuple(_lagrange_weights(nodes, m)) + (Fraction(0),)
+    else:
+        if m < 1:
+            raise ValueError("Una regla cerrada necesita m >= 1")
+        nodes = list(range(0, m + 1))
+        panel = tuple(_lagrange_weights(nodes, m))
+    # Con una cantidad impar de nodos la simetría suma un grado de exactitud
+    degree = len(nodes) if len(nodes) % 2 == 1 else len(nodes) - 1
+    return WeightedRule(panel, degree + 1)
+
+
+def weighted_rule(panel: Sequence, order: int) -> WeightedRule:
+    """Regla a partir de pesos explícitos (en unidades de h), p. ej. Weddle."""
+    return WeightedRule(tuple(Fraction(w) for w in panel), order)
+
+
+# Presets disponibles para los endpoints (nombre -> regla)
+RULES: Dict[str, WeightedRule] = {
+    "trapezoidal": newton_cotes(1),
+    "simpson_13": newton_cotes(2),
+    "simpson_38": newton_cotes(3),
+    "boole": newton_cotes(4),
+    # Weddle: Newton–Cotes de 7 puntos con coeficientes redondeados, 3h/10·(1,5,1,6,1,5,1)
+    "weddle": weighted_rule([Fraction(3, 10) * c for c in (1, 5, 1, 6, 1, 5, 1)], 6),
+}
+
+
+def adjust_n(rule: WeightedRule, n: int) -> int:
+    """Lleva n al mínimo/múltiplo de m que exige la regla."""
+    m = rule.m
+    if n < m:
+        n = m
+    if n % m != 0:
+        n = ((n // m) + 1) * m
+    return n
+
+
+class CompositeWeights(NamedTuple):
+    """
+    Pesos compuestos sobre los n+1 nodos de la grilla: peso_i = coefs[i] · h · num / den.
+    Los coeficientes se reducen a enteros (p. ej. Simpson 1/3: 1,4,2,...,4,1 con h/3).
+    `nodes` son los índices con peso no nulo (los únicos que hace falta evaluar).
+    """
+    coefs: List[float]
+    num: int
+    den: int
+    nodes: Sequence[int]
+
+    def scale(self, h: float) -> float:
+        return h * self.num / self.den
+
+
+@lru_cache(maxsize=64)
+def _reduced_panel(rule: WeightedRule) -> Tuple[Tuple[int, ...], int, int]:
+    """Pesos del panel como enteros coprimos y la escala num/den (la parte cara, con fracciones)."""
+    panel = rule.panel
+    den = 1
+    for w in panel:
+        den = den * w.denominator // gcd(den, w.denominator)
+    ints = [int(w * den) for w in panel]
+    g = 0
+    for v in ints:
+        g = gcd(g, v)
+    g = g or 1
+    return tuple(v // g for v in ints), g, den
+
+
+def composite_weights(rule: WeightedRule, n: int) -> CompositeWeights:
+    """
+    Vector de pesos de la regla compuesta para n subintervalos (n múltiplo de m),
+    para cualquier regla: un preset de RULES, newton_cotes(m, closed) o weighted_rule.
+    Sólo se cachea el panel reducido por regla: el vector se arma en cada llamada
+    repitiendo el panel, para no retener vectores de O(n) en memoria.
+    """
+    panel, num, den = _reduced_panel(rule)
+    m = len(panel) - 1
+    if n % m != 0:
+        raise ValueError(f"n={n} no es múltiplo de {m} para la regla")
+
+    count = n // m
+    weights = [float(c) for c in panel[:-1]] * count + [float(panel[-1])]
+    if count > 1:
+        # En las fronteras entre paneles se suman el último peso de uno y el primero del siguiente
+        weights[m:n:m] = [float(panel[0] + panel[-1])] * (count - 1)
+    if all(panel):
+        nodes: Sequence[int] = range(n + 1)
+    else:
+        nodes = tuple(i for i, c in enumerate(weights) if c != 0)
+    return CompositeWeights(weights, num, den, nodes)
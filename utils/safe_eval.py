@@ -1,31 +1,157 @@
 import ast
+import copy
 import math
+import os
 
-def make_safe_func(expr: str):
-    # Reemplaza ^ por ** para que funcione como potencia en Python
-    expr = expr.replace('^', '**')
+# Límites para operandos enteros: Python calcula enteros de precisión arbitraria,
+# así que '9**9**9' o 'factorial(10**6)' pueden bloquear un worker indefinidamente.
+MAX_INT_BITS = int(os.getenv("MAX_INT_BITS", "10000"))
+MAX_FACTORIAL = int(os.getenv("MAX_FACTORIAL", "1000"))
 
-    allowed_names = {k: getattr(math, k) for k in dir(math) if not k.startswith("__")}
-    allowed_names.update({"abs": abs, "pow": pow})
+class ExpressionLimitError(ValueError):
+    """Un operando excede los límites de evaluación permitidos."""
 
-    expr_ast = ast.parse(expr, mode='eval')
+def _is_int(v) -> bool:
+    return isinstance(v, int)
+
+def safe_pow(base, exp, mod=None):
+    if mod is not None:
+        return pow(base, exp, mod)
+    if _is_int(base) and _is_int(exp) and exp > 0 and abs(base) > 1:
+        if exp * math.log2(abs(base)) > MAX_INT_BITS:
+            raise ExpressionLimitError(f"Potencia demasiado grande: {base}**{exp}")
+    return pow(base, exp)
+
+def safe_factorial(n):
+    if isinstance(n, (int, float)) and n > MAX_FACTORIAL:
+        raise ExpressionLimitError(f"factorial({n}) excede el máximo permitido ({MAX_FACTORIAL})")
+    return math.factorial(n)
+
+def safe_comb(n, k):
+    if isinstance(n, (int, float)) and n > 10 * MAX_FACTORIAL:
+        raise ExpressionLimitError(f"comb({n}, ...) excede el máximo permitido")
+    return math.comb(n, k)
+
+def safe_perm(n, k=None):
+    if isinstance(n, (int, float)) and n > 10 * MAX_FACTORIAL:
+        raise ExpressionLimitError(f"perm({n}, ...) excede el máximo permitido")
+    return math.perm(n, k)
+
+# Reemplazos que se inyectan en el entorno de evaluación
+GUARDED_NAMES = {
+    "pow": safe_pow,
+    "_safe_pow": safe_pow,
+    "factorial": safe_factorial,
+    "comb": safe_comb,
+    "perm": safe_perm,
+}
+
+class _PowGuard(ast.NodeTransformer):
+    """Reescribe `a ** b` como `_safe_pow(a, b)`."""
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.copy_location(
+                ast.Call(
+                    func=ast.Name(id="_safe_pow", ctx=ast.Load()),
+                    args=[node.left, node.right],
+                    keywords=[],
+                ),
+                node,
+            )
+        return node
+
+def guard_ast(tree: ast.Expression) -> ast.Expression:
+    return ast.fix_missing_locations(_PowGuard().visit(tree))
+
+# Llamadas cuyo costo crece con el tamaño de los operandos enteros
+_LIMITED_CALLS = ("pow", "factorial", "comb", "perm")
+
+_CONST_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name,
+                ast.Constant, ast.operator, ast.unaryop, ast.Load)
 
+def _math_names() -> dict:
+    names = {k: getattr(math, k) for k in dir(math) if not k.startswith("__")}
+    names.update({"abs": abs, "pi": math.pi, "e": math.e})
+    names.update(GUARDED_NAMES)
+    return names
+
+def _is_numeric_constant(node: ast.AST, names: dict) -> bool:
+    """True si el subárbol no depende de x y sólo usa números y funciones de math."""
+    for sub in ast.walk(node):
+        if not isinstance(sub, _CONST_NODES):
+            return False
+        if isinstance(sub, ast.Name) and sub.id not in names:
+            return False
+        if isinstance(sub, ast.Constant) and (
+            isinstance(sub.value, bool) or not isinstance(sub.value, (int, float, complex))
+        ):
+            return False
+        if isinstance(sub, ast.Call) and (sub.keywords or not isinstance(sub.func, ast.Name)):
+            return False
+    return True
+
+def check_constant_limits(expr: str) -> None:
+    """
+    Chequeo estático previo a SymPy, que evalúa las constantes enteras de forma
+    eager (sympify('9**9**9') no termina) y no se puede interrumpir.
+    Evalúa con los guards cada subárbol constante que sea una potencia o una
+    llamada a factorial/comb/perm y propaga ExpressionLimitError; cualquier otro
+    error se ignora (lo reporta después la evaluación normal).
+    """
+    try:
+        tree = ast.parse(expr.replace("^", "**"), mode="eval")
+    except (SyntaxError, ValueError):
+        return
+    names = _math_names()
+    for node in ast.walk(tree):
+        is_pow = isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow)
+        is_call = (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                   and node.func.id in _LIMITED_CALLS)
+        if not (is_pow or is_call) or not _is_numeric_constant(node, names):
+            continue
+        sub = guard_ast(ast.Expression(body=copy.deepcopy(node)))
+        try:
+            eval(compile(sub, "<const>", "eval"), {"__builtins__": {}}, names)
+        except ExpressionLimitError:
+            raise
+        except Exception:
+            pass
+
+# Nodos permitidos en las expresiones del usuario (sin <<, *, etc. sobre strings)
+_ALLOWED_NODES = (
+    ast.Call, ast.BinOp, ast.UnaryOp, ast.Expression,
+    ast.Load, ast.Add, ast.Sub, ast.Mult, ast.Div,
+    ast.Pow, ast.USub, ast.UAdd, ast.Mod, ast.Constant,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.Gt,
+    ast.LtE, ast.GtE, ast.And, ast.Or, ast.BoolOp
+)
+
+def check_allowed_nodes(expr_ast: ast.AST, allowed_names: dict) -> None:
+    """Rechaza (ValueError) nombres desconocidos, nodos fuera de la lista y constantes no numéricas."""
     for node in ast.walk(expr_ast):
         if isinstance(node, ast.Name):
             if node.id != 'x' and node.id not in allowed_names:
                 raise ValueError(f"Nombre no permitido en expresión: {node.id}")
-        elif isinstance(node, (
-            ast.Call, ast.BinOp, ast.UnaryOp, ast.Expression,
-            ast.Load, ast.Add, ast.Sub, ast.Mult, ast.Div,
-            ast.Pow, ast.USub, ast.UAdd, ast.Mod, ast.Constant,
-            ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.Gt,
-            ast.LtE, ast.GtE, ast.And, ast.Or, ast.BoolOp
-        )):
-            continue
-        else:
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float, complex)):
+                raise ValueError(f"Constante no permitida en expresión: {node.value!r}")
+        elif not isinstance(node, _ALLOWED_NODES):
             raise ValueError(f"Nodo AST no permitido: {type(node).__name__}")
 
-    code = compile(expr_ast, '<string>', 'eval')
+def make_safe_func(expr: str):
+    # Reemplaza ^ por ** para que funcione como potencia en Python
+    expr = expr.replace('^', '**')
+
+    allowed_names = {k: getattr(math, k) for k in dir(math) if not k.startswith("__")}
+    allowed_names.update({"abs": abs})
+    allowed_names.update(GUARDED_NAMES)
+
+    expr_ast = ast.parse(expr, mode='eval')
+    check_allowed_nodes(expr_ast, allowed_names)
+
+    code = compile(guard_ast(expr_ast), '<string>', 'eval')
 
     def f(x: float) -> float:
         return eval(code, {'__builtins__': {}}, {**allowed_names, 'x': x})